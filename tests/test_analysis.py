@@ -0,0 +1,122 @@
+from pathlib import Path
+import sys
+
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+from scipy.spatial.distance import pdist, squareform
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from wwtp_abrg import analysis
+
+
+def _toy_table() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    values = rng.poisson(3, size=(40, 8)).astype(float)
+    values[0] = 5.0
+    return pd.DataFrame(
+        values,
+        index=pd.Index([f"K{i:05d}" for i in range(40)], name="KO"),
+        columns=[f"SEM{i:02d}" for i in range(1, 9)],
+    )
+
+
+def test_differential_abundance_matches_scipy() -> None:
+    ko_table = _toy_table()
+    metadata = pd.DataFrame({"sample_id": ko_table.columns, "period": ["early"] * 4 + ["late"] * 4})
+    for method in ["ttest", "mannwhitney"]:
+        table = analysis.differential_abundance(ko_table, metadata, method=method).table
+        for ko, row in ko_table.iterrows():
+            vals_a, vals_b = row.iloc[:4].values, row.iloc[4:].values
+            if method == "ttest":
+                expected = stats.ttest_ind(vals_a, vals_b, equal_var=False)
+            else:
+                expected = stats.mannwhitneyu(vals_a, vals_b, alternative="two-sided")
+            np.testing.assert_allclose(
+                table.loc[ko, ["stat", "p_value"]].to_numpy(dtype=float),
+                [expected[0], expected[1]],
+                equal_nan=True,
+            )
+
+
+def test_parallel_pdist_matches_pdist(monkeypatch) -> None:
+    data = np.random.default_rng(2).random((23, 6))
+    monkeypatch.setattr(analysis, "_PDIST_BLOCK_PAIRS", 10)
+    np.testing.assert_allclose(
+        analysis._parallel_pdist(data, "braycurtis", n_jobs=3),
+        pdist(data, metric="braycurtis"),
+    )
+
+
+def test_bray_curtis_condensed_pairs() -> None:
+    ko_table = _toy_table()
+    distances = analysis.compute_bray_curtis(ko_table)
+    square = squareform(pdist(ko_table.T.to_numpy(), metric="braycurtis"))
+    assert len(distances) == 8 * 7 // 2
+    assert distances[("SEM02", "SEM05")] == square[1, 4]
+    np.testing.assert_allclose(squareform(distances.to_numpy()), square)
+
+
+def test_stratified_to_ko_table_matches_groupby() -> None:
+    stratified = pd.DataFrame(
+        {
+            "KO": ["K00002", "K00001", "K00002", "K00001"],
+            "Taxon": ["TaxonA", "TaxonA", "TaxonB", "TaxonB"],
+            "S1": [1.0, 2.0, np.nan, 4.0],
+            "S2": [5.0, 0.0, 7.0, 8.0],
+        }
+    )
+    expected = stratified.groupby("KO")[["S1", "S2"]].sum()
+    pd.testing.assert_frame_equal(analysis.stratified_to_ko_table(stratified), expected)
+
+    unassigned = pd.DataFrame({"KO": [None], "Taxon": ["TaxonC"], "S1": [9.0], "S2": [9.0]})
+    with_unassigned = pd.concat([stratified, unassigned], ignore_index=True)
+    pd.testing.assert_frame_equal(
+        analysis.stratified_to_ko_table(with_unassigned), with_unassigned.groupby("KO")[["S1", "S2"]].sum()
+    )
+
+
+def test_bh_qvalues_skip_nan() -> None:
+    p_values = np.array([0.01, np.nan, 0.04, 0.03, 0.5])
+    np.testing.assert_allclose(
+        analysis._bh_qvalues(p_values),
+        [0.04, np.nan, 0.04 * 4 / 3, 0.04 * 4 / 3, 0.5],
+        equal_nan=True,
+    )
+
+
+def test_top_kos_over_time_matches_stable_sort() -> None:
+    ko_table = pd.DataFrame(np.random.default_rng(4).poisson(2, size=(200, 5)))
+    expected = ko_table.mean(axis=1).sort_values(ascending=False, kind="stable").index
+    for top_n in [0, 1, 7, 200, 250]:
+        top = analysis.top_kos_over_time(ko_table, top_n, cache=analysis.AbundanceCache(ko_table))
+        assert list(top.index) == list(expected[:top_n])
+
+
+def test_top_kos_time_series_tidy_orders_replicate_days() -> None:
+    rel = _toy_table()
+    metadata = pd.DataFrame({"sample_id": rel.columns[::-1], "day": [3, 1, 1, 2, 3, 1, np.nan, 2]})
+    top = rel.mean(axis=1).sort_values(ascending=False).head(5).index
+    expected = (
+        rel.loc[top]
+        .reset_index()
+        .melt(id_vars="KO", var_name="sample_id", value_name="abundance")
+        .merge(metadata, on="sample_id", how="left")[["day", "KO", "abundance", "sample_id"]]
+        .sort_values(["day", "KO"])
+        .reset_index(drop=True)
+    )
+
+    tidy = analysis.top_kos_time_series_tidy(rel, metadata, top_n=5)
+
+    pd.testing.assert_frame_equal(tidy, expected, check_dtype=False)
+
+
+def test_relative_abundance_divides_before_narrowing() -> None:
+    counts = pd.DataFrame({"S1": np.array([2**24 + 1, 3], dtype=np.int32)})
+    expected = counts.to_numpy(dtype=np.float64) / float(2**24 + 4)
+
+    np.testing.assert_array_equal(analysis.compute_relative_abundance(counts, dtype="float64").to_numpy(), expected)
+    np.testing.assert_array_equal(
+        analysis.compute_relative_abundance(counts).to_numpy(), expected.astype(np.float32)
+    )
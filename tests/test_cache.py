@@ -0,0 +1,60 @@
+from pathlib import Path
+import hashlib
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from wwtp_abrg import cache
+from wwtp_abrg.cache import StepCache, fingerprint, hash_file
+
+
+def test_step_cache_reuses_results_for_identical_inputs(tmp_path: Path) -> None:
+    steps = StepCache(tmp_path / "cache")
+    table = pd.DataFrame({"S1": [1, 2], "S2": [3, 4]}, index=["K00001", "K00002"])
+    calls = []
+
+    def compute() -> pd.DataFrame:
+        calls.append(1)
+        return table * 2
+
+    first = steps.run("double", (table, "x"), compute)
+    second = steps.run("double", (table.copy(), "x"), compute)
+    steps.run("double", (table + 1, "x"), compute)
+    steps.run("double", (table, "y"), compute)
+
+    pd.testing.assert_frame_equal(first, second)
+    assert len(calls) == 3
+    assert len(list((tmp_path / "cache" / "double").glob("*.pkl"))) == 3
+
+
+def test_hash_file_streams_blocks(tmp_path: Path) -> None:
+    path = tmp_path / "ko.csv"
+    path.write_bytes(b"KO,S1\nK00001,3\n" * 100)
+
+    assert hash_file(path, block_size=7) == hashlib.blake2b(path.read_bytes(), digest_size=16).hexdigest()
+
+
+def test_fingerprint_tracks_source_code(monkeypatch) -> None:
+    before = fingerprint("pca", ("inputs",))
+    monkeypatch.setattr(cache, "_code_digest", lambda: "edited")
+
+    assert fingerprint("pca", ("inputs",)) != before
+
+
+def test_fingerprint_tracks_dependency_versions(monkeypatch) -> None:
+    before = fingerprint("pca", ("inputs",))
+    monkeypatch.setattr(cache, "_dependency_versions", lambda: (("numpy", "0.0"),))
+
+    assert fingerprint("pca", ("inputs",)) != before
+
+
+def test_step_cache_recomputes_unreadable_entries(tmp_path: Path) -> None:
+    step_cache = StepCache(tmp_path)
+    step_cache.run("richness", ("inputs",), lambda: 1)
+    (entry,) = (tmp_path / "richness").glob("*.pkl")
+    entry.write_bytes(b"truncated")
+
+    assert step_cache.run("richness", ("inputs",), lambda: 2) == 2
+    assert step_cache.run("richness", ("inputs",), lambda: 3) == 2
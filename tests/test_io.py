@@ -0,0 +1,122 @@
+from pathlib import Path
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from wwtp_abrg import io
+
+
+def test_read_ko_table_narrows_dtype(tmp_path: Path) -> None:
+    counts_path = tmp_path / "counts.csv"
+    pd.DataFrame({"KO": ["K00001", "K00002"], "S1": [3.0, 0.0], "S2": [1.0, 7.0]}).to_csv(counts_path, index=False)
+    fractions_path = tmp_path / "fractions.csv"
+    pd.DataFrame({"KO": ["K00001", "K00002"], "S1": [0.25, 0.75], "S2": [1.0, 0.0]}).to_csv(fractions_path, index=False)
+
+    counts = io.read_ko_table(counts_path)
+    fractions = io.read_ko_table(fractions_path)
+
+    assert (counts.dtypes == np.int32).all()
+    assert (fractions.dtypes == np.float32).all()
+    np.testing.assert_array_equal(counts.to_numpy(), [[3, 1], [0, 7]])
+    assert (io.read_ko_table(fractions_path, dtype="float64").dtypes == np.float64).all()
+    assert (io.read_ko_table(counts_path, dtype="float64").dtypes == np.int32).all()
+
+
+def test_readers_match_c_engine(tmp_path: Path, monkeypatch) -> None:
+    readers = [
+        (io.read_ko_table, "data/raw/ko_abundance.csv"),
+        (io.read_stratified, "data/raw/ko_stratified.csv"),
+        (io.read_metadata, "metadata/sample_metadata.csv"),
+        (io.read_annotations, "metadata/ko_annotations.csv"),
+    ]
+    unnamed_path = tmp_path / "unnamed_index.csv"
+    unnamed_path.write_text(",S1,S2\nK00001,1,2\nK00002,3,4\n", encoding="utf-8")
+    readers.append((io.read_ko_table, unnamed_path))
+    duplicated_path = tmp_path / "duplicated.csv"
+    duplicated_path.write_text("KO,S1,S1,S2\nK00001,1,2,3\n", encoding="utf-8")
+
+    parsed = [reader(path) for reader, path in readers]
+    with pytest.raises(ValueError, match="Duplicate sample columns"):
+        io.read_ko_table(duplicated_path)
+    monkeypatch.setattr(io, "_CSV_ENGINE", "c")
+    for (reader, path), df in zip(readers, parsed):
+        pd.testing.assert_frame_equal(df, reader(path))
+    pd.testing.assert_frame_equal(parsed[-1], io.read_ko_table(unnamed_path, chunksize=1))
+    with pytest.raises(ValueError, match="Duplicate sample columns"):
+        io.read_ko_table(duplicated_path)
+
+
+def test_write_table_switches_large_tables_to_parquet(tmp_path: Path, monkeypatch) -> None:
+    df = pd.DataFrame(np.arange(12, dtype=np.float32).reshape(4, 3), index=["K1", "K2", "K3", "K4"], columns=["a", "b", "c"])
+    monkeypatch.setattr(io, "_PARQUET_MIN_CELLS", 10)
+
+    written = io.write_table(df, tmp_path / "table.csv", fmt="auto")
+
+    assert written == tmp_path / "table.parquet"
+    assert not (tmp_path / "table.csv").exists()
+    pd.testing.assert_frame_equal(pd.read_parquet(written), df)
+    assert io.write_table(df, tmp_path / "results.csv") == tmp_path / "results.csv"
+
+
+def test_large_csv_writes_round_trip(tmp_path: Path, monkeypatch) -> None:
+    df = pd.DataFrame(
+        {
+            "a": np.array([0.1, 1 / 3, np.nan], dtype=np.float32),
+            "b": [1, 2, 3],
+            "c": ["x", "y,z", "w"],
+            "d": [True, False, True],
+        },
+        index=pd.Index(["K1", "K2", "K3"], name="KO"),
+    )
+    monkeypatch.setattr(io, "_ARROW_CSV_MIN_CELLS", 1)
+
+    io.write_table(df, tmp_path / "table.csv", fmt="csv")
+    io.write_tidy(df, tmp_path / "tidy.csv")
+    df.to_csv(tmp_path / "expected.csv")
+
+    expected = pd.read_csv(tmp_path / "expected.csv", index_col=0)
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "table.csv", index_col=0), expected)
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "tidy.csv"), expected.reset_index(drop=True))
+
+
+def test_large_csv_writes_quote_categorical_text(tmp_path: Path, monkeypatch) -> None:
+    df = pd.DataFrame(
+        {"group": pd.Categorical(["early, dry", "late"]), "abundance": [0.5, 1.5]},
+        index=pd.Index(["S1", "S2"], name="sample_id"),
+    )
+    monkeypatch.setattr(io, "_ARROW_CSV_MIN_CELLS", 1)
+
+    io.write_table(df, tmp_path / "table.csv", fmt="csv")
+
+    written = pd.read_csv(tmp_path / "table.csv", index_col=0)
+    assert written["group"].tolist() == ["early, dry", "late"]
+    assert written["abundance"].tolist() == [0.5, 1.5]
+
+
+def test_read_ko_table_chunked_matches_full_read(tmp_path: Path) -> None:
+    path = tmp_path / "ko.csv"
+    table = pd.DataFrame(
+        {"KO": [f"K{i:05d}" for i in range(5)], "S1": [1, 2, 3, 4, 5], "S2": [0.0, 1.0, 2.0, 3.0, 0.5]}
+    )
+    table.to_csv(path, index=False)
+
+    pd.testing.assert_frame_equal(io.read_ko_table(path, chunksize=2), io.read_ko_table(path))
+
+
+def test_mirror_file_copies_once(tmp_path: Path) -> None:
+    src = tmp_path / "ko.csv"
+    src.write_text("KO,S1\nK00001,3\n", encoding="utf-8")
+    dest = tmp_path / "processed" / "ko_raw_abundance.csv"
+
+    io.mirror_file(src, dest)
+    first_mtime = dest.stat().st_mtime_ns
+    io.mirror_file(src, dest)
+
+    assert dest.read_bytes() == src.read_bytes()
+    assert dest.stat().st_mtime_ns == first_mtime
+    assert not os.path.samefile(src, dest)
@@ -0,0 +1,32 @@
+from pathlib import Path
+import sys
+
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from wwtp_abrg import network
+
+
+def test_spearman_network_matches_pairwise_scipy() -> None:
+    rng = np.random.default_rng(1)
+    values = rng.poisson(2, size=(20, 9)).astype(float)
+    values[3] = 1.0
+    values[4] = values[5] * 2
+    ko_table = pd.DataFrame(values, index=[f"K{i:05d}" for i in range(20)])
+
+    edges = network.spearman_network(ko_table, r_threshold=0.3, p_threshold=0.5)
+
+    expected = []
+    kos = ko_table.index.tolist()
+    for i, ko_a in enumerate(kos):
+        for ko_b in kos[i + 1 :]:
+            r, p = stats.spearmanr(ko_table.loc[ko_a], ko_table.loc[ko_b])
+            if abs(r) >= 0.3 and p <= 0.5:
+                expected.append((ko_a, ko_b, r, p))
+    expected_df = pd.DataFrame(expected, columns=["source", "target", "rho", "p_value"])
+
+    assert edges[["source", "target"]].values.tolist() == expected_df[["source", "target"]].values.tolist()
+    np.testing.assert_allclose(edges[["rho", "p_value"]].to_numpy(), expected_df[["rho", "p_value"]].to_numpy(), atol=1e-12)
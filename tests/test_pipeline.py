@@ -1,11 +1,15 @@
 from pathlib import Path
+import multiprocessing
 import sys
 
 import numpy as np
 import pandas as pd
+import pytest
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
+from wwtp_abrg import pipeline
+from wwtp_abrg.analysis import compute_relative_abundance
 from wwtp_abrg.pipeline import run_pipeline
 
 
@@ -66,3 +70,40 @@ def test_pipeline_runs(tmp_path: Path) -> None:
 
     for path in expected:
         assert path.exists()
+
+
+def test_pipeline_rejects_missing_group_labels(tmp_path: Path) -> None:
+    metadata = pd.read_csv("metadata/sample_metadata.csv")
+    metadata.loc[0, "period"] = np.nan
+    metadata_path = tmp_path / "sample_metadata.csv"
+    metadata.to_csv(metadata_path, index=False)
+    config = {
+        "input": {
+            "ko_table": "data/raw/ko_abundance.csv",
+            "metadata": str(metadata_path),
+            "ko_annotations": "metadata/ko_annotations.csv",
+        },
+        "output": {},
+        "parameters": {"diff_method": "ttest"},
+    }
+
+    with pytest.raises(ValueError, match="Missing values found in metadata"):
+        run_pipeline(config)
+
+
+def test_run_stages_shares_frames_with_spawned_workers(tmp_path: Path) -> None:
+    ko_table = pd.read_csv("data/raw/ko_abundance.csv", index_col=0)
+    state = {
+        "ko_table": ko_table,
+        "rel_abundance": compute_relative_abundance(ko_table),
+        "stratified_ko_table": None,
+        "tables_dir": tmp_path,
+        "config": {"parameters": {"top_n": 5}},
+    }
+    tasks = {"richness": (pipeline._stage_richness, ()), "top_kos": (pipeline._stage_top_kos, ())}
+
+    serial = pipeline._run_stages(tasks, state, workers=1)
+    spawned = pipeline._run_stages(tasks, state, workers=2, mp_context=multiprocessing.get_context("spawn"))
+
+    pd.testing.assert_frame_equal(spawned["richness"], serial["richness"])
+    pd.testing.assert_frame_equal(spawned["top_kos"], serial["top_kos"])
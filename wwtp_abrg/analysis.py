@@ -2,18 +2,26 @@
 
 from __future__ import annotations
 
+import os
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import cached_property
 from typing import Iterable, Tuple
 
 import numpy as np
 import pandas as pd
 import scipy.stats as stats
 from scipy.cluster.hierarchy import linkage
-from statsmodels.stats.multitest import multipletests
+from scipy.linalg import eigh
+from scipy.sparse import csr_matrix
+from scipy.spatial.distance import cdist, pdist, squareform
 from skbio.diversity import beta_diversity
 from skbio.stats.ordination import pcoa
 from skbio.stats.distance import DistanceMatrix, permanova
 
+_PDIST_BLOCK_PAIRS = 1 << 20
+_PDIST_METRICS = {"braycurtis", "canberra", "chebyshev", "cityblock", "cosine", "euclidean", "jaccard", "sqeuclidean"}
+
 
 @dataclass
 class DiffResult:
@@ -21,19 +29,132 @@ class DiffResult:
     summary: pd.DataFrame
 
 
-def compute_relative_abundance(ko_table: pd.DataFrame) -> pd.DataFrame:
-    totals = ko_table.sum(axis=0)
-    return ko_table.divide(totals, axis=1)
+@dataclass
+class AbundanceCache:
+    """Per-table intermediates shared by several analyses.
+
+    Each attribute is computed on first access and reused afterwards, so
+    callers that pass the same cache avoid repeating the full-matrix pass.
+    """
+
+    table: pd.DataFrame
+
+    @cached_property
+    def values(self) -> np.ndarray:
+        return np.ascontiguousarray(self.table.to_numpy())
+
+    @cached_property
+    def sample_major(self) -> np.ndarray:
+        return np.ascontiguousarray(self.values.T)
+
+    @cached_property
+    def row_means(self) -> np.ndarray:
+        return self.values.mean(axis=1)
+
+    @cached_property
+    def row_ranks(self) -> np.ndarray:
+        return stats.rankdata(self.values, axis=1)
+
+    @cached_property
+    def nonzero_mask(self) -> np.ndarray:
+        return self.values > 0
+
+    @cached_property
+    def prevalence(self) -> np.ndarray:
+        return np.count_nonzero(self.nonzero_mask, axis=1) / self.values.shape[1]
+
+    @cached_property
+    def col_sums(self) -> np.ndarray:
+        """Per-sample totals, accumulated in float64 (exact for integer counts)."""
+        return self.values.sum(axis=0, dtype=np.float64)
 
+    @cached_property
+    def col_nnz(self) -> np.ndarray:
+        return np.count_nonzero(self.nonzero_mask, axis=0)
 
-def compute_richness(ko_table: pd.DataFrame) -> pd.Series:
-    return (ko_table > 0).sum(axis=0)
 
+def _sample_major(matrix: pd.DataFrame, cache: AbundanceCache | None) -> np.ndarray:
+    """C-contiguous ``(n_samples, n_kos)`` array of ``matrix``, taken from ``cache`` when given."""
+    if cache is None:
+        return np.ascontiguousarray(matrix.to_numpy().T)
+    return cache.sample_major
 
-def top_kos_over_time(ko_table: pd.DataFrame, top_n: int) -> pd.DataFrame:
-    mean_abundance = ko_table.mean(axis=1).sort_values(ascending=False)
-    top_kos = mean_abundance.head(top_n).index
-    return ko_table.loc[top_kos]
+
+def _row_means(table: pd.DataFrame, cache: AbundanceCache | None) -> pd.Series:
+    if cache is None:
+        return table.mean(axis=1)
+    return pd.Series(cache.row_means, index=table.index)
+
+
+def compute_relative_abundance(
+    ko_table: pd.DataFrame,
+    dtype: str | np.dtype = "float32",
+    cache: AbundanceCache | None = None,
+) -> pd.DataFrame:
+    """Column-normalise to per-sample fractions; float32 unless ``dtype`` asks for more.
+
+    The division runs in float64 against float64 totals and is only cast to
+    ``dtype`` on output, so large integer counts are not rounded first.
+    """
+    values = ko_table.to_numpy()
+    totals = values.sum(axis=0, dtype=np.float64) if cache is None else cache.col_sums
+    fractions = np.empty(values.shape, dtype=dtype)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.divide(values, totals, out=fractions, casting="unsafe")
+    return pd.DataFrame(fractions, index=ko_table.index, columns=ko_table.columns)
+
+
+def compute_richness(ko_table: pd.DataFrame, cache: AbundanceCache | None = None) -> pd.DataFrame:
+    """Tidy ``sample_id``/``ko_richness`` frame counting the KOs detected in each sample."""
+    nnz = np.count_nonzero(ko_table.to_numpy(), axis=0) if cache is None else cache.col_nnz
+    return pd.DataFrame({"sample_id": ko_table.columns, "ko_richness": nnz})
+
+
+def top_kos_over_time(ko_table: pd.DataFrame, top_n: int, cache: AbundanceCache | None = None) -> pd.DataFrame:
+    """Rows of the ``top_n`` KOs by mean abundance, most abundant first (ties keep table order)."""
+    means = _row_means(ko_table, cache).to_numpy()
+    if top_n <= 0:
+        return ko_table.iloc[:0]
+    if top_n < len(means):
+        top = np.argpartition(-means, top_n - 1)[:top_n]
+        # argpartition may cut a tie group arbitrarily; take the boundary ties in table order.
+        cutoff = means[top].min()
+        above = np.flatnonzero(means > cutoff)
+        ties = np.flatnonzero(means == cutoff)[: top_n - len(above)]
+        top = np.concatenate([above, ties])
+    else:
+        top = np.arange(len(means))
+    top = top[np.argsort(-means[top], kind="stable")]
+    return ko_table.iloc[top]
+
+
+def _welch_ttest(
+    vals_a: np.ndarray,
+    vals_b: np.ndarray,
+    mean_a: np.ndarray,
+    mean_b: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise Welch's t-test, matching ``stats.ttest_ind(..., equal_var=False)``."""
+    n_a = vals_a.shape[1]
+    n_b = vals_b.shape[1]
+    vn_a = vals_a.var(axis=1, ddof=1) / n_a
+    vn_b = vals_b.var(axis=1, ddof=1) / n_b
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dof = (vn_a + vn_b) ** 2 / (vn_a**2 / (n_a - 1) + vn_b**2 / (n_b - 1))
+        dof = np.where(np.isnan(dof), 1.0, dof)
+        stat = (mean_a - mean_b) / np.sqrt(vn_a + vn_b)
+    p_value = 2 * stats.t.sf(np.abs(stat), dof)
+    return stat, p_value
+
+
+def _bh_qvalues(p_values: np.ndarray) -> np.ndarray:
+    """Benjamini-Hochberg adjusted p-values; NaNs stay NaN and are not counted as tests."""
+    q_values = np.full(p_values.shape, np.nan)
+    tested = np.flatnonzero(~np.isnan(p_values))
+    order = tested[np.argsort(p_values[tested], kind="stable")]
+    ranked = p_values[order] * len(order) / np.arange(1, len(order) + 1)
+    q_values[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1.0)
+    return q_values
 
 
 def differential_abundance(
@@ -46,62 +167,158 @@ def differential_abundance(
 ) -> DiffResult:
     group_a_samples = metadata.loc[metadata[group_col] == group_a, "sample_id"].tolist()
     group_b_samples = metadata.loc[metadata[group_col] == group_b, "sample_id"].tolist()
-    results = []
-    for ko, row in ko_table.iterrows():
-        vals_a = row[group_a_samples].values
-        vals_b = row[group_b_samples].values
-        if method == "ttest":
-            stat, p_value = stats.ttest_ind(vals_a, vals_b, equal_var=False)
-        else:
-            stat, p_value = stats.mannwhitneyu(vals_a, vals_b, alternative="two-sided")
-        results.append((ko, stat, p_value, vals_a.mean(), vals_b.mean()))
+    a_idx = ko_table.columns.get_indexer(group_a_samples)
+    b_idx = ko_table.columns.get_indexer(group_b_samples)
+    if (a_idx < 0).any() or (b_idx < 0).any():
+        missing = [s for s, i in zip([*group_a_samples, *group_b_samples], [*a_idx, *b_idx]) if i < 0]
+        raise KeyError(f"Samples missing from KO table: {missing}")
+    values = ko_table.to_numpy(dtype=np.float64)
+    vals_a = values[:, a_idx]
+    vals_b = values[:, b_idx]
+    mean_a = vals_a.mean(axis=1)
+    mean_b = vals_b.mean(axis=1)
+    if method == "ttest":
+        stat, p_value = _welch_ttest(vals_a, vals_b, mean_a, mean_b)
+    else:
+        stat, p_value = stats.mannwhitneyu(vals_a, vals_b, axis=1, alternative="two-sided")
     res_df = pd.DataFrame(
-        results,
-        columns=["KO", "stat", "p_value", "mean_early", "mean_late"],
-    ).set_index("KO")
-    res_df["q_value"] = multipletests(res_df["p_value"], method="fdr_bh")[1]
+        {"stat": stat, "p_value": p_value, "mean_early": mean_a, "mean_late": mean_b},
+        index=ko_table.index.rename("KO"),
+        copy=False,
+    )
+    res_df["q_value"] = _bh_qvalues(np.asarray(p_value, dtype=np.float64))
     summary = res_df.sort_values("q_value")
     return DiffResult(table=res_df, summary=summary)
 
 
-def compute_pca(matrix: pd.DataFrame, n_components: int = 2) -> pd.DataFrame:
-    data = np.ascontiguousarray(matrix.T.values)
-    data = data - data.mean(axis=0)
-    u, s, vh = np.linalg.svd(data, full_matrices=False)
-    coords = u[:, :n_components] * s[:n_components]
+def compute_pca(
+    matrix: pd.DataFrame,
+    n_components: int = 2,
+    cache: AbundanceCache | None = None,
+) -> pd.DataFrame:
+    """Project samples onto the leading principal components.
+
+    Only the top ``n_components`` eigenpairs of the smaller of the sample Gram
+    matrix and the KO covariance matrix are solved for, instead of a full SVD.
+    """
+    data = _sample_major(matrix, cache).astype(np.float64)
+    data -= data.mean(axis=0)
+    n_samples, n_features = data.shape
+    if n_samples <= n_features:
+        eigvals, eigvecs = eigh(data @ data.T, subset_by_index=[n_samples - n_components, n_samples - 1])
+        coords = eigvecs[:, ::-1] * np.sqrt(np.clip(eigvals[::-1], 0.0, None))
+    else:
+        _, eigvecs = eigh(data.T @ data, subset_by_index=[n_features - n_components, n_features - 1])
+        coords = data @ eigvecs[:, ::-1]
+    signs = np.sign(coords[np.abs(coords).argmax(axis=0), np.arange(n_components)])
+    coords *= np.where(signs == 0, 1.0, signs)
     return pd.DataFrame(coords, index=matrix.columns, columns=[f"PC{i+1}" for i in range(n_components)])
 
 
-def compute_pcoa(matrix: pd.DataFrame, metric: str = "braycurtis") -> Tuple[pd.DataFrame, pd.DataFrame]:
-    data = np.ascontiguousarray(matrix.T.values)
-    distance = beta_diversity(metric, data, ids=matrix.columns)
+def _pdist_rows(data: np.ndarray, start: int, stop: int, metric: str) -> np.ndarray:
+    """Condensed-order distances from rows ``start:stop`` to every later row.
+
+    Pairs inside the block come from ``pdist`` and pairs with later rows from
+    ``cdist``; each row's two runs are then interleaved in condensed order.
+    """
+    within = pdist(data[start:stop], metric=metric)
+    if stop == data.shape[0]:
+        return within
+    cross = cdist(data[start:stop], data[stop:], metric=metric)
+    out = np.empty(within.size + cross.size)
+    pos = offset = 0
+    for row, tail in enumerate(cross):
+        n_within = stop - start - 1 - row
+        out[pos : pos + n_within] = within[offset : offset + n_within]
+        pos += n_within
+        offset += n_within
+        out[pos : pos + tail.size] = tail
+        pos += tail.size
+    return out
+
+
+def _parallel_pdist(data: np.ndarray, metric: str, n_jobs: int | None = None) -> np.ndarray:
+    """``pdist`` split into row blocks of similar pair counts and run on a thread pool.
+
+    scipy's distance kernels release the GIL, so the blocks run concurrently and
+    are concatenated back in condensed order. Small inputs go straight to ``pdist``.
+    """
+    n_samples = data.shape[0]
+    n_pairs = n_samples * (n_samples - 1) // 2
+    workers = n_jobs if n_jobs and n_jobs > 0 else os.cpu_count() or 1
+    if workers == 1 or n_pairs <= _PDIST_BLOCK_PAIRS:
+        return pdist(data, metric=metric)
+    rows = np.arange(n_samples)
+    row_offsets = rows * n_samples - rows * (rows + 1) // 2
+    n_blocks = min(n_samples - 1, max(workers, n_pairs // _PDIST_BLOCK_PAIRS))
+    bounds = np.unique(np.searchsorted(row_offsets, np.linspace(0, n_pairs, n_blocks + 1)[1:-1]))
+    bounds = [0, *bounds[(bounds > 0) & (bounds < n_samples)].tolist(), n_samples]
+    spans = list(zip(bounds[:-1], bounds[1:]))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        parts = list(executor.map(lambda span: _pdist_rows(data, span[0], span[1], metric), spans))
+    return np.concatenate(parts)
+
+
+def compute_pcoa(
+    matrix: pd.DataFrame,
+    metric: str = "braycurtis",
+    n_jobs: int | None = None,
+    cache: AbundanceCache | None = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    data = _sample_major(matrix, cache)
+    if metric in _PDIST_METRICS:
+        distance = DistanceMatrix(squareform(_parallel_pdist(data, metric, n_jobs)), ids=matrix.columns)
+    else:
+        distance = beta_diversity(metric, data, ids=matrix.columns)
     ordination = pcoa(distance)
     coords = ordination.samples.iloc[:, :2]
     return coords, ordination.proportion_explained
 
 
-def compute_bray_curtis(matrix: pd.DataFrame) -> pd.DataFrame:
-    data = np.ascontiguousarray(matrix.T.values)
-    distance = beta_diversity("braycurtis", data, ids=matrix.columns)
-    return pd.DataFrame(distance.data, index=distance.ids, columns=distance.ids)
+def compute_bray_curtis(
+    matrix: pd.DataFrame,
+    n_jobs: int | None = None,
+    cache: AbundanceCache | None = None,
+) -> pd.Series:
+    """Condensed Bray-Curtis distances indexed by ``(sample_i, sample_j)`` pairs with i < j.
 
+    Values follow ``pdist`` order, so ``squareform(series.to_numpy())`` recovers the square matrix.
+    """
+    condensed = _parallel_pdist(_sample_major(matrix, cache), "braycurtis", n_jobs)
+    rows, cols = np.triu_indices(matrix.shape[1], k=1)
+    index = pd.MultiIndex.from_arrays(
+        [matrix.columns[rows], matrix.columns[cols]], names=["sample_i", "sample_j"]
+    )
+    return pd.Series(condensed, index=index, name="bray_curtis")
 
-def compute_permanova(distance_df: pd.DataFrame, metadata: pd.DataFrame, group_col: str = "period") -> pd.DataFrame:
-    distance = DistanceMatrix(distance_df.values, ids=distance_df.index)
+
+def compute_permanova(
+    distances: pd.DataFrame | pd.Series,
+    metadata: pd.DataFrame,
+    group_col: str = "period",
+) -> pd.DataFrame:
+    """PERMANOVA from a square distance frame or a condensed series from ``compute_bray_curtis``."""
+    if isinstance(distances, pd.Series):
+        # Pairs run (0, 1), (0, 2), ... so sample 0 leads and every other sample appears as a j.
+        ids = distances.index.get_level_values(0)[:1].append(distances.index.get_level_values(1).unique())
+        distance = DistanceMatrix(squareform(distances.to_numpy()), ids=ids)
+    else:
+        distance = DistanceMatrix(distances.values, ids=distances.index)
     result = permanova(distance, metadata.set_index("sample_id"), column=group_col)
     return pd.DataFrame([result.to_dict()])
 
 
-def compute_clustering(distance_df: pd.DataFrame, method: str = "average") -> pd.DataFrame:
-    condensed = np.ascontiguousarray(distance_df.values)[
-        np.triu_indices_from(distance_df.values, k=1)
-    ]
+def compute_clustering(condensed: np.ndarray | pd.Series, method: str = "average") -> pd.DataFrame:
+    """Hierarchical clustering from a condensed distance vector of length n*(n-1)/2."""
+    condensed = np.ascontiguousarray(condensed, dtype=np.float64)
     linkage_matrix = linkage(condensed, method=method)
     return pd.DataFrame(linkage_matrix, columns=["cluster1", "cluster2", "distance", "count"])
 
 
-def compute_prevalence(ko_table: pd.DataFrame) -> pd.Series:
-    return (ko_table > 0).sum(axis=1) / ko_table.shape[1]
+def compute_prevalence(ko_table: pd.DataFrame, cache: AbundanceCache | None = None) -> pd.Series:
+    if cache is not None:
+        return pd.Series(cache.prevalence, index=ko_table.index)
+    return pd.Series(np.count_nonzero(ko_table.to_numpy(), axis=1) / ko_table.shape[1], index=ko_table.index)
 
 
 def generate_top30(
@@ -110,9 +327,10 @@ def generate_top30(
     top_n: int,
     prevalence_threshold: float,
     mechanism_filter: Iterable[str] | None = None,
+    cache: AbundanceCache | None = None,
 ) -> pd.DataFrame:
-    mean_abundance = ko_table.mean(axis=1)
-    prevalence = compute_prevalence(ko_table)
+    mean_abundance = _row_means(ko_table, cache)
+    prevalence = compute_prevalence(ko_table, cache)
     merged = annotations.set_index("KO").copy()
     merged["mean_abundance"] = mean_abundance
     merged["prevalence"] = prevalence
@@ -124,16 +342,30 @@ def generate_top30(
 
 def summarize_stratified(stratified: pd.DataFrame) -> pd.DataFrame:
     sample_cols = [col for col in stratified.columns if col not in {"KO", "Taxon"}]
-    tidy = stratified.melt(id_vars=["KO", "Taxon"], value_vars=sample_cols, var_name="sample_id", value_name="abundance")
-    summary = tidy.groupby(["KO", "Taxon"], as_index=False)["abundance"].sum()
+    totals = pd.DataFrame(
+        {
+            "KO": stratified["KO"].to_numpy(),
+            "Taxon": stratified["Taxon"].to_numpy(),
+            "abundance": np.nansum(stratified[sample_cols].to_numpy(), axis=1),
+        }
+    )
+    summary = totals.groupby(["KO", "Taxon"], as_index=False)["abundance"].sum()
     return summary
 
 
 def stratified_to_ko_table(stratified: pd.DataFrame) -> pd.DataFrame:
     """Collapse stratified KO table to KO-by-sample abundance."""
     sample_cols = [col for col in stratified.columns if col not in {"KO", "Taxon"}]
-    grouped = stratified.groupby("KO", as_index=False)[sample_cols].sum()
-    return grouped.set_index("KO")[sample_cols]
+    codes, kos = pd.factorize(stratified["KO"], sort=True)
+    # Rows without a KO (code -1) are dropped, as groupby("KO") would.
+    valid = codes >= 0
+    codes = codes[valid]
+    values = stratified[sample_cols].to_numpy()[valid]
+    if values.dtype.kind == "f":
+        values = np.nan_to_num(values, nan=0.0)
+    n_rows = len(codes)
+    indicator = csr_matrix((np.ones(n_rows, dtype=values.dtype), (codes, np.arange(n_rows))), shape=(len(kos), n_rows))
+    return pd.DataFrame(indicator @ values, index=pd.Index(kos, name="KO").infer_objects(), columns=sample_cols)
 
 
 def build_table1(top30: pd.DataFrame) -> pd.DataFrame:
@@ -148,16 +380,46 @@ def build_table1(top30: pd.DataFrame) -> pd.DataFrame:
     return table[["rank", "KO", *columns[1:]]]
 
 
+def sorted_days(metadata: pd.DataFrame, day_col: str = "day") -> pd.Series:
+    """Day per sample_id, stable-sorted ascending so same-day replicates keep metadata order."""
+    return pd.Series(metadata[day_col].to_numpy(), index=metadata["sample_id"]).sort_values(kind="stable")
+
+
 def top_kos_time_series_tidy(
     relative_abundance: pd.DataFrame,
     metadata: pd.DataFrame,
     top_n: int,
     day_col: str = "day",
+    cache: AbundanceCache | None = None,
+    days: pd.Series | None = None,
 ) -> pd.DataFrame:
-    """Return tidy time-series table for top KOs."""
-    mean_abundance = relative_abundance.mean(axis=1).sort_values(ascending=False)
-    top_kos = mean_abundance.head(top_n).index
-    top_table = relative_abundance.loc[top_kos]
-    tidy = top_table.reset_index().melt(id_vars="KO", var_name="sample_id", value_name="abundance")
-    tidy = tidy.merge(metadata[["sample_id", day_col]], on="sample_id", how="left")
-    return tidy[["day", "KO", "abundance", "sample_id"]].sort_values(["day", "KO"])
+    """Return tidy time-series table for top KOs.
+
+    ``days`` maps sample_id to day, sorted ascending; it is derived from
+    ``metadata`` when omitted. Samples without a day are placed last.
+    """
+    if days is None:
+        days = sorted_days(metadata, day_col)
+    mean_abundance = _row_means(relative_abundance, cache).sort_values(ascending=False)
+    top_kos = mean_abundance.head(top_n).index.sort_values()
+    row_idx = relative_abundance.index.get_indexer(top_kos)
+    col_idx = relative_abundance.columns.get_indexer(days.index)
+    day_values = days.to_numpy()[col_idx >= 0]
+    col_idx = col_idx[col_idx >= 0]
+    undated = np.setdiff1d(np.arange(relative_abundance.shape[1]), col_idx)
+    if len(undated):
+        col_idx = np.concatenate([col_idx, undated])
+        day_values = np.concatenate([day_values.astype(np.float64), np.full(len(undated), np.nan)])
+    block = relative_abundance.to_numpy()[np.ix_(row_idx, col_idx)]
+    n_kos = len(top_kos)
+    day_column = np.repeat(day_values, n_kos)
+    # Rows run (day, KO); replicate samples of one day keep their table column order.
+    order = np.lexsort((np.repeat(col_idx, n_kos), np.tile(np.arange(n_kos), len(col_idx)), day_column))
+    return pd.DataFrame(
+        {
+            "day": day_column[order],
+            "KO": np.tile(top_kos.to_numpy(), len(col_idx))[order],
+            "abundance": block.T.ravel()[order],
+            "sample_id": np.repeat(relative_abundance.columns.to_numpy()[col_idx], n_kos)[order],
+        }
+    )
@@ -0,0 +1,128 @@
+"""Content-addressed on-disk memoization of pipeline steps."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import pickle
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+import numpy as np
+import pandas as pd
+
+from wwtp_abrg import __version__, io
+
+T = TypeVar("T")
+
+
+def _update(digest: Any, obj: Any) -> None:
+    """Feed a stable byte representation of ``obj`` into ``digest``."""
+    if isinstance(obj, pd.DataFrame):
+        digest.update(b"frame")
+        digest.update(repr((obj.shape, list(obj.columns), [str(t) for t in obj.dtypes])).encode())
+        digest.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, pd.Series):
+        digest.update(b"series")
+        digest.update(repr((obj.name, str(obj.dtype))).encode())
+        digest.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, np.ndarray):
+        digest.update(b"array")
+        digest.update(repr((obj.shape, obj.dtype.str)).encode())
+        digest.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        digest.update(b"dict")
+        for key in sorted(obj, key=repr):
+            _update(digest, key)
+            _update(digest, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        digest.update(type(obj).__name__.encode())
+        for item in obj:
+            _update(digest, item)
+    else:
+        digest.update(repr(obj).encode())
+
+
+@lru_cache(maxsize=None)
+def _code_digest() -> str:
+    """BLAKE2b digest of the package's Python sources, so code edits invalidate cached steps."""
+    digest = hashlib.blake2b(digest_size=16)
+    package_dir = Path(__file__).resolve().parent
+    for source in sorted(package_dir.glob("*.py")):
+        digest.update(source.name.encode())
+        digest.update(source.read_bytes())
+    return digest.hexdigest()
+
+
+_NUMERIC_DEPENDENCIES = ("numpy", "pandas", "scipy", "scikit-bio")
+
+
+@lru_cache(maxsize=None)
+def _dependency_versions() -> tuple[tuple[str, str], ...]:
+    """Installed versions of the libraries step results are computed with."""
+    versions = []
+    for name in _NUMERIC_DEPENDENCIES:
+        try:
+            versions.append((name, metadata.version(name)))
+        except metadata.PackageNotFoundError:
+            versions.append((name, ""))
+    return tuple(versions)
+
+
+def fingerprint(step: str, inputs: Any) -> str:
+    """BLAKE2b digest of a step name, the package version, source code and dependencies, and its inputs."""
+    digest = hashlib.blake2b(digest_size=16)
+    _update(digest, (step, __version__, _code_digest(), _dependency_versions(), inputs))
+    return digest.hexdigest()
+
+
+def hash_file(path: str | Path, block_size: int = 1 << 20) -> str:
+    """BLAKE2b digest of a file's bytes, read in ``block_size`` blocks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with Path(path).open("rb") as handle:
+        for block in iter(lambda: handle.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class StepCache:
+    """Memoize step results under ``root/<step>/<hash>.pkl``.
+
+    With ``root`` set to ``None`` every step is simply computed.
+    """
+
+    root: Path | None = None
+
+    def run(self, step: str, inputs: Any, compute: Callable[[], T]) -> T:
+        """Return the stored result for ``inputs`` or call ``compute`` and store it.
+
+        ``inputs`` must cover everything the result depends on; derived helpers
+        such as ``AbundanceCache`` or ``n_jobs`` should be left out.
+        """
+        if self.root is None:
+            return compute()
+        key = fingerprint(step, inputs)
+        step_dir = Path(self.root) / step
+        path = step_dir / f"{key}.pkl"
+        if path.exists():
+            try:
+                with path.open("rb") as handle:
+                    return pickle.load(handle)
+            except Exception as exc:
+                # A truncated or unreadable entry is a miss; it is overwritten below.
+                logging.getLogger("wwtp_abrg").warning("Discarding unreadable cache entry %s: %s", path, exc)
+        result = compute()
+        step_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with tmp_path.open("wb") as handle:
+            pickle.dump(result, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        manifest = {"step": step, "key": key, "version": __version__, "created": datetime.now(timezone.utc).isoformat()}
+        io.write_json(manifest, path.with_suffix(".json"))
+        return result
@@ -4,13 +4,22 @@ from __future__ import annotations
 
 from pathlib import Path
 
-import matplotlib.pyplot as plt
+import matplotlib
 import numpy as np
 import pandas as pd
+from matplotlib.figure import Figure
+
+from wwtp_abrg.analysis import sorted_days
+
+# Figures are only ever saved to disk. They are built as standalone ``Figure``
+# objects rather than through pyplot's global figure manager, so several plots
+# can render at once from worker threads.
+matplotlib.use("Agg")
 
 
 def plot_top_kos(top_kos: pd.DataFrame, output_path: str | Path) -> None:
-    fig, ax = plt.subplots(figsize=(8, 4))
+    fig = Figure(figsize=(8, 4))
+    ax = fig.subplots()
     top_kos.T.plot(kind="bar", ax=ax)
     ax.set_title("Top KOs Over Time")
     ax.set_xlabel("Sample")
@@ -19,7 +28,6 @@ def plot_top_kos(top_kos: pd.DataFrame, output_path: str | Path) -> None:
     fig.tight_layout()
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
     fig.savefig(output_path)
-    plt.close(fig)
 
 
 def _scatter_by_group(
@@ -32,7 +40,8 @@ def _scatter_by_group(
     x_label: str,
     y_label: str,
 ) -> None:
-    fig, ax = plt.subplots(figsize=(5, 4))
+    fig = Figure(figsize=(5, 4))
+    ax = fig.subplots()
     if metadata is not None and group_col and group_col in metadata.columns:
         merged = coords.merge(metadata[["sample_id", group_col]], left_index=True, right_on="sample_id", how="left")
         for group, group_df in merged.groupby(group_col):
@@ -50,7 +59,6 @@ def _scatter_by_group(
     fig.tight_layout()
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
     fig.savefig(output_path)
-    plt.close(fig)
 
 
 def plot_pca(
@@ -80,29 +88,34 @@ def plot_top30_heatmap(
     output_path: str | Path,
     label_style: str = "KO_gene",
     log1p: bool = True,
+    days: pd.Series | None = None,
 ) -> None:
+    """Heatmap of the Top-30 KOs; ``days`` is the day per sample_id, sorted ascending."""
     ko_ids = top30.index.tolist()
-    heatmap_data = relative_abundance.loc[ko_ids]
-    sample_order = heatmap_data.columns.tolist()
-    if "day" in metadata.columns:
-        sample_order = (
-            metadata.set_index("sample_id")
-            .loc[sample_order]
-            .sort_values("day")
-            .index.tolist()
-        )
-    heatmap_data = heatmap_data[sample_order]
+    row_idx = relative_abundance.index.get_indexer(ko_ids)
+    if (row_idx < 0).any():
+        raise KeyError(f"KOs missing from abundance table: {[ko for ko, i in zip(ko_ids, row_idx) if i < 0]}")
+    if days is None and "day" in metadata.columns:
+        days = sorted_days(metadata)
+    col_idx = np.arange(relative_abundance.shape[1])
+    if days is not None:
+        col_idx = relative_abundance.columns.get_indexer(days.index)
+        col_idx = col_idx[col_idx >= 0]
+        if len(col_idx) != relative_abundance.shape[1]:
+            missing = relative_abundance.columns.difference(days.index).tolist()
+            raise KeyError(f"Samples missing from metadata: {missing}")
+    sample_order = relative_abundance.columns[col_idx].tolist()
+    heatmap_values = relative_abundance.to_numpy()[np.ix_(row_idx, col_idx)]
     if log1p:
-        heatmap_values = np.log1p(heatmap_data.values)
-    else:
-        heatmap_values = heatmap_data.values
+        heatmap_values = np.log1p(heatmap_values)
 
     if label_style == "KO_gene" and "gene_name" in top30.columns:
         labels = [f"{ko} {top30.loc[ko, 'gene_name']}" for ko in ko_ids]
     else:
         labels = ko_ids
 
-    fig, ax = plt.subplots(figsize=(10, max(4, len(ko_ids) * 0.35)))
+    fig = Figure(figsize=(10, max(4, len(ko_ids) * 0.35)))
+    ax = fig.subplots()
     im = ax.imshow(heatmap_values, aspect="auto", interpolation="nearest", cmap="viridis")
     ax.set_yticks(range(len(labels)))
     ax.set_yticklabels(labels, fontsize=8)
@@ -115,21 +128,28 @@ def plot_top30_heatmap(
     fig.tight_layout()
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
     fig.savefig(output_path)
-    plt.close(fig)
 
 
-def plot_richness_over_time(richness_df: pd.DataFrame, metadata: pd.DataFrame, output_path: str | Path) -> None:
-    merged = richness_df.merge(metadata[["sample_id", "day"]], on="sample_id", how="left")
-    merged = merged.dropna(subset=["day"]).sort_values("day")
-    fig, ax = plt.subplots(figsize=(7, 4))
-    ax.plot(merged["day"], merged["ko_richness"], marker="o")
+def plot_richness_over_time(
+    richness_df: pd.DataFrame,
+    metadata: pd.DataFrame,
+    output_path: str | Path,
+    days: pd.Series | None = None,
+) -> None:
+    if days is None:
+        days = sorted_days(metadata)
+    days = days.dropna()
+    positions = pd.Index(richness_df["sample_id"]).get_indexer(days.index)
+    found = positions >= 0
+    fig = Figure(figsize=(7, 4))
+    ax = fig.subplots()
+    ax.plot(days.to_numpy()[found], richness_df["ko_richness"].to_numpy()[positions[found]], marker="o")
     ax.set_title("KO Richness Over Time")
     ax.set_xlabel("Day")
     ax.set_ylabel("KO Richness")
     fig.tight_layout()
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
     fig.savefig(output_path)
-    plt.close(fig)
 
 
 def plot_top_kos_time_series(
@@ -137,11 +157,12 @@ def plot_top_kos_time_series(
     output_path: str | Path,
     rolling_window: int = 7,
 ) -> None:
-    fig, ax = plt.subplots(figsize=(8, 4))
-    for ko, group_df in tidy_df.groupby("KO"):
-        group_df = group_df.sort_values("day")
-        rolling = group_df["abundance"].rolling(rolling_window, min_periods=1).mean()
-        ax.plot(group_df["day"], rolling, label=ko)
+    wide = tidy_df.pivot_table(index="day", columns="KO", values="abundance", aggfunc="mean").sort_index()
+    rolling = wide.rolling(rolling_window, min_periods=1).mean()
+    fig = Figure(figsize=(8, 4))
+    ax = fig.subplots()
+    for line, ko in zip(ax.plot(rolling.index, rolling.to_numpy()), rolling.columns):
+        line.set_label(ko)
     ax.set_title("Top KOs Time Series (Rolling Mean)")
     ax.set_xlabel("Day")
     ax.set_ylabel("Relative Abundance")
@@ -149,4 +170,3 @@ def plot_top_kos_time_series(
     fig.tight_layout()
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
     fig.savefig(output_path, bbox_inches="tight")
-    plt.close(fig)
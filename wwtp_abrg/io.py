@@ -2,43 +2,182 @@
 
 from __future__ import annotations
 
+import csv
+import json
+import os
+import shutil
+from importlib.util import find_spec
 from pathlib import Path
 from typing import Iterable
 
+import numpy as np
 import pandas as pd
 
-
-def read_ko_table(path: str | Path) -> pd.DataFrame:
-    """Read KO abundance table (rows KOs, columns samples)."""
-    df = pd.read_csv(path, index_col=0)
+_HAS_PYARROW = find_spec("pyarrow") is not None
+_HAS_ORJSON = find_spec("orjson") is not None
+# pyarrow's multithreaded CSV parser when it is installed, pandas' C parser otherwise.
+_CSV_ENGINE = "pyarrow" if _HAS_PYARROW else "c"
+# Tables with more cells than this are written as Parquet rather than CSV.
+_PARQUET_MIN_CELLS = 100_000
+# Below this many cells pandas' CSV writer beats the cost of converting to Arrow.
+_ARROW_CSV_MIN_CELLS = 10_000
+
+
+def _read_csv(path: str | Path, **kwargs) -> pd.DataFrame:
+    df = pd.read_csv(path, engine=_CSV_ENGINE, **kwargs)
+    if kwargs.get("index_col") is not None and df.index.name == "":
+        # The pyarrow engine names a blank index header ""; the C engine leaves it unnamed.
+        df.index.name = None
     return df
 
 
+def _check_unique_header(path: str | Path) -> None:
+    """Reject duplicate column labels, which the C engine would silently rename to ``name.1``."""
+    with Path(path).open("r", encoding="utf-8", newline="") as handle:
+        header = next(csv.reader(handle), [])
+    duplicates = sorted({label for label in header if header.count(label) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate sample columns in {path}: {duplicates}")
+
+
+def _narrow_abundance(df: pd.DataFrame, float_dtype: str | np.dtype = "float32") -> pd.DataFrame:
+    """Downcast a numeric abundance table to int32 counts, or non-integer values to ``float_dtype``."""
+    values = df.to_numpy()
+    if values.dtype.kind not in "fiu":
+        return df
+    integral = values.dtype.kind in "iu" or bool(np.isfinite(values).all() and (np.mod(values, 1) == 0).all())
+    if integral:
+        limits = np.iinfo(np.int32)
+        if values.size == 0 or (values.min() >= limits.min and values.max() <= limits.max):
+            return df.astype(np.int32)
+    return df.astype(float_dtype)
+
+
+def read_ko_table(
+    path: str | Path,
+    chunksize: int | None = None,
+    dtype: str | np.dtype = "float32",
+) -> pd.DataFrame:
+    """Read KO abundance table (rows KOs, columns samples) as int32 counts or ``dtype`` values.
+
+    Integer counts are always narrowed to int32, which is exact; non-integer
+    tables are kept at ``dtype`` precision (float32 by default).
+
+    With ``chunksize`` the CSV is parsed ``chunksize`` rows at a time and each
+    chunk is narrowed before the next is read, so the full-width float64 table
+    is never held in memory.
+    """
+    _check_unique_header(path)
+    if chunksize is None:
+        return _narrow_abundance(_read_csv(path, index_col=0), dtype)
+    chunks = [_narrow_abundance(chunk, dtype) for chunk in pd.read_csv(path, index_col=0, chunksize=chunksize)]
+    if len({tuple(chunk.dtypes) for chunk in chunks}) > 1:
+        chunks = [chunk.astype(dtype) for chunk in chunks]
+    return pd.concat(chunks)
+
+
 def read_metadata(path: str | Path) -> pd.DataFrame:
     """Read sample metadata."""
-    return pd.read_csv(path)
+    return _read_csv(path)
 
 
 def read_annotations(path: str | Path) -> pd.DataFrame:
     """Read KO annotations (KO, gene_name, mechanism, antibiotic_class)."""
-    return pd.read_csv(path)
+    return _read_csv(path)
 
 
 def read_stratified(path: str | Path) -> pd.DataFrame:
     """Read stratified KO table (KO, Taxon, samples)."""
-    return pd.read_csv(path)
-
-
-def write_table(df: pd.DataFrame, path: str | Path) -> None:
-    """Write DataFrame to CSV."""
-    Path(path).parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(path, index=True)
+    return _read_csv(path)
+
+
+def _write_csv(df: pd.DataFrame, path: Path, index: bool) -> None:
+    """Write ``df`` as CSV, through pyarrow's C++ writer for large frames.
+
+    Cells are only quoted when some text value needs it and booleans are
+    written as ``True``/``False`` like ``to_csv``; pyarrow still quotes the
+    header and prints floats in shortest form (``1`` rather than ``1.0``).
+    """
+    if _HAS_PYARROW and df.size > _ARROW_CSV_MIN_CELLS:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+
+        frame = df
+        if index:
+            # Match to_csv: an unnamed index gets an empty header.
+            frame = df.reset_index(names=[""] if df.index.nlevels == 1 and df.index.name is None else None)
+        bool_cols = frame.select_dtypes(include="bool").columns
+        if len(bool_cols):
+            frame = frame.copy(deep=False)
+            for col in bool_cols:
+                frame[col] = np.where(frame[col].to_numpy(), "True", "False")
+        text = frame.select_dtypes(include=["object", "string", "category"])
+        needs_quotes = any(
+            text[col].astype("string").str.contains(r'[,"\r\n]', regex=True, na=False).any() for col in text.columns
+        )
+        quoting = "needed" if needs_quotes else "none"
+        try:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            pa_csv.write_csv(table, path, write_options=pa_csv.WriteOptions(quoting_style=quoting))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            pass
+        else:
+            return
+    df.to_csv(path, index=index)
+
+
+def write_table(df: pd.DataFrame, path: str | Path, fmt: str = "csv") -> Path:
+    """Write DataFrame to CSV, or to zstd Parquet beside ``path``.
+
+    ``fmt`` is ``"csv"``, ``"parquet"`` or ``"auto"``, which picks Parquet only
+    for large tables. Returns the path actually written.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == "auto":
+        fmt = "parquet" if _HAS_PYARROW and df.size > _PARQUET_MIN_CELLS else "csv"
+    if fmt == "parquet":
+        path = path.with_suffix(".parquet")
+        df.to_parquet(path, engine="pyarrow", compression="zstd", index=True)
+    else:
+        _write_csv(df, path, index=True)
+    return path
+
+
+def mirror_file(src: str | Path, dest: str | Path) -> Path:
+    """Copy ``src`` byte-for-byte to ``dest`` unless ``dest`` is already an unchanged copy."""
+    src, dest = Path(src), Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if dest.exists():
+        src_stat, dest_stat = src.stat(), dest.stat()
+        if os.path.samefile(src, dest) or (
+            src_stat.st_size == dest_stat.st_size and src_stat.st_mtime_ns == dest_stat.st_mtime_ns
+        ):
+            return dest
+    shutil.copy2(src, dest)
+    return dest
 
 
 def write_tidy(df: pd.DataFrame, path: str | Path) -> None:
     """Write DataFrame to CSV without index."""
-    Path(path).parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(path, index=False)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _write_csv(df, path, index=False)
+
+
+def write_json(obj: object, path: str | Path) -> None:
+    """Write ``obj`` as indented JSON atomically, via a temporary file and ``os.replace``."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if _HAS_ORJSON:
+        import orjson
+
+        payload = orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    else:
+        payload = json.dumps(obj, indent=2).encode("utf-8")
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(payload)
+    os.replace(tmp_path, path)
 
 
 def ensure_dirs(paths: Iterable[str | Path]) -> None:
@@ -2,53 +2,255 @@
 
 from __future__ import annotations
 
-import json
+import contextlib
 import logging
-from datetime import datetime
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Iterable, List, Tuple
 
-from wwtp_abrg import __version__, analysis, figures, io, network, validation
+import numpy as np
+import pandas as pd
+
+from wwtp_abrg import __version__, analysis, io, validation
+from wwtp_abrg.cache import StepCache, fingerprint, hash_file
+
+# Inputs shared by every analysis stage; set once per worker by the pool initializer.
+_STAGE_STATE: Dict[str, Any] = {}
+
+# Abundance tables handed to pool workers as memory-mapped arrays instead of pickles.
+_SHARED_FRAMES = ("ko_table", "rel_abundance", "stratified_ko_table")
+
+
+def _worker_count(n_jobs: int | None) -> int:
+    return n_jobs if n_jobs and n_jobs > 0 else os.cpu_count() or 1
+
+
+def _share_frame(df: pd.DataFrame, path: Path) -> Dict[str, Any]:
+    """Dump ``df`` values to the ``.npy`` file ``path`` and return the spec needed to map it back."""
+    np.save(path, df.to_numpy())
+    return {"path": str(path), "index": df.index, "columns": df.columns}
+
+
+def _attach_frame(spec: Dict[str, Any]) -> pd.DataFrame:
+    """Rebuild a read-only DataFrame over the memory-mapped values of a shared frame."""
+    values = np.load(spec["path"], mmap_mode="r")
+    return pd.DataFrame(values, index=spec["index"], columns=spec["columns"], copy=False)
+
+
+def _init_stage_state(state: Dict[str, Any]) -> None:
+    _STAGE_STATE.clear()
+    _STAGE_STATE.update(state)
+    for key in _SHARED_FRAMES:
+        if isinstance(_STAGE_STATE.get(key), dict):
+            _STAGE_STATE[key] = _attach_frame(_STAGE_STATE[key])
+    _STAGE_STATE.setdefault("raw_cache", analysis.AbundanceCache(_STAGE_STATE["ko_table"]))
+    _STAGE_STATE.setdefault("rel_cache", analysis.AbundanceCache(_STAGE_STATE["rel_abundance"]))
+    if _STAGE_STATE.get("stratified_ko_table") is not None:
+        _STAGE_STATE.setdefault("stratified_cache", analysis.AbundanceCache(_STAGE_STATE["stratified_ko_table"]))
+
+
+def _stage_richness() -> pd.DataFrame:
+    state = _STAGE_STATE
+    richness_df = analysis.compute_richness(state["ko_table"], cache=state["raw_cache"])
+    io.write_tidy(richness_df, state["tables_dir"] / "ko_richness.csv")
+    return richness_df
+
+
+def _stage_top_kos() -> pd.DataFrame:
+    state = _STAGE_STATE
+    top_n = state["config"]["parameters"]["top_n"]
+    top_kos = analysis.top_kos_over_time(state["ko_table"], top_n, cache=state["raw_cache"])
+    io.write_table(top_kos, state["tables_dir"] / "top_kos_over_time.csv")
+    return top_kos
+
+
+def _stage_differential(comparisons: Iterable[Dict[str, Any]]) -> None:
+    state = _STAGE_STATE
+    tables_dir = state["tables_dir"]
+    for comparison in comparisons:
+        diff = analysis.differential_abundance(
+            state["ko_table"],
+            state["metadata"],
+            group_col=comparison["group_col"],
+            group_a=comparison["group_a"],
+            group_b=comparison["group_b"],
+            method=comparison.get("method", "ttest"),
+        )
+        io.write_table(diff.table, tables_dir / f"differential_abundance_{comparison['name']}.csv")
+        io.write_table(diff.summary, tables_dir / f"differential_abundance_{comparison['name']}_summary.csv")
+
+
+def _stage_pca() -> pd.DataFrame:
+    state = _STAGE_STATE
+    pca_coords = state["steps"].run(
+        "pca",
+        (state["input_keys"]["rel_abundance"],),
+        lambda: analysis.compute_pca(state["rel_abundance"], cache=state["rel_cache"]),
+    )
+    io.write_table(pca_coords, state["tables_dir"] / "pca_coordinates.csv")
+    return pca_coords
+
+
+def _stage_pcoa() -> pd.DataFrame:
+    state = _STAGE_STATE
+    params = state["config"]["parameters"]
+    tables_dir = state["tables_dir"]
+    pcoa_coords, pcoa_variance = state["steps"].run(
+        "pcoa",
+        (state["input_keys"]["rel_abundance"], params["pcoa_metric"]),
+        lambda: analysis.compute_pcoa(
+            state["rel_abundance"],
+            metric=params["pcoa_metric"],
+            n_jobs=state["kernel_jobs"],
+            cache=state["rel_cache"],
+        ),
+    )
+    io.write_table(pcoa_coords, tables_dir / "pcoa_coordinates.csv")
+    io.write_table(pcoa_variance.to_frame("proportion"), tables_dir / "pcoa_variance.csv")
+    return pcoa_coords
+
+
+def _stage_distances() -> None:
+    """Bray-Curtis matrix plus the PERMANOVA and clustering that consume it."""
+    state = _STAGE_STATE
+    params = state["config"]["parameters"]
+    tables_dir = state["tables_dir"]
+    steps = state["steps"]
+    rel_key = state["input_keys"]["rel_abundance"]
+    bray_curtis = steps.run(
+        "bray_curtis_condensed",
+        (rel_key,),
+        lambda: analysis.compute_bray_curtis(
+            state["rel_abundance"], n_jobs=state["kernel_jobs"], cache=state["rel_cache"]
+        ),
+    )
+    io.write_table(
+        bray_curtis.to_frame(), tables_dir / "bray_curtis_distance.csv", fmt=state["config"]["output"].get("format", "auto")
+    )
+
+    permanova_df = steps.run(
+        "permanova",
+        (rel_key, state["metadata"]),
+        lambda: analysis.compute_permanova(bray_curtis, state["metadata"]),
+    )
+    io.write_tidy(permanova_df, tables_dir / "permanova.csv")
+
+    clustering = steps.run(
+        "clustering",
+        (rel_key, params["clustering_method"]),
+        lambda: analysis.compute_clustering(bray_curtis, method=params["clustering_method"]),
+    )
+    io.write_table(clustering, tables_dir / "clustering.csv")
+
+
+def _stage_network() -> None:
+    state = _STAGE_STATE
+    from wwtp_abrg import network
+
+    params = state["config"]["parameters"]
+    edges = state["steps"].run(
+        "spearman_network",
+        (state["input_keys"]["rel_abundance"], params["correlation_r"], params["p_value"]),
+        lambda: network.spearman_network(
+            state["rel_abundance"],
+            r_threshold=params["correlation_r"],
+            p_threshold=params["p_value"],
+            ranks=state["rel_cache"].row_ranks,
+        ),
+    )
+    io.write_tidy(edges, state["networks_dir"] / "spearman_edges.csv")
+
+
+def _stage_taxon(stratified: pd.DataFrame) -> None:
+    stratified_summary = analysis.summarize_stratified(stratified)
+    io.write_tidy(stratified_summary, _STAGE_STATE["tables_dir"] / "taxon_contributions.csv")
+
+
+def _stage_scenario(name: str, settings: Dict[str, Any]) -> pd.DataFrame:
+    """Build and write one Top-30 scenario table."""
+    state = _STAGE_STATE
+    params = state["config"]["parameters"]
+    mechanism = settings.get("mechanism")
+    use_stratified = settings.get("use_stratified", False)
+    prevalence = settings.get("min_prevalence", params["prevalence_threshold"])
+
+    def compute() -> pd.DataFrame:
+        return analysis.generate_top30(
+            state["stratified_ko_table"] if use_stratified else state["ko_table"],
+            state["annotations"],
+            top_n=params["top30_n"],
+            prevalence_threshold=prevalence,
+            mechanism_filter=mechanism if mechanism else None,
+            cache=state["stratified_cache"] if use_stratified else state["raw_cache"],
+        )
+
+    input_keys = state["input_keys"]
+    table_key = input_keys["stratified" if use_stratified else "ko_table"]
+    key_inputs = (table_key, input_keys["annotations"], mechanism, prevalence, params["top30_n"])
+    top30 = state["steps"].run("top30", key_inputs, compute)
+    io.write_table(top30, state["tables_dir"] / f"top30_{name}.csv")
+    return top30
+
+
+def _run_stages(
+    tasks: Dict[str, Tuple[Callable[..., Any], Tuple[Any, ...]]],
+    state: Dict[str, Any],
+    workers: int,
+    mp_context: multiprocessing.context.BaseContext | None = None,
+) -> Dict[str, Any]:
+    """Run independent stages, on a process pool when ``workers`` > 1, and return results by name.
+
+    The pool uses ``mp_context``, or the default multiprocessing context when it is ``None``.
+
+    Forked workers inherit ``state`` copy-on-write. Under other start methods the
+    abundance tables are written once to ``.npy`` files that each worker maps
+    read-only instead of unpickling its own copy; such workers build their own
+    ``AbundanceCache`` objects over them.
+    """
+    if workers > 1:
+        ctx = mp_context or multiprocessing.get_context()
+        with contextlib.ExitStack() as stack:
+            shared = state
+            if ctx.get_start_method() != "fork":
+                tmp_dir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="wwtp_abrg-")))
+                shared = {key: value for key, value in state.items() if not key.endswith("_cache")}
+                for key in _SHARED_FRAMES:
+                    if shared.get(key) is not None:
+                        shared[key] = _share_frame(shared[key], tmp_dir / f"{key}.npy")
+            executor = stack.enter_context(
+                ProcessPoolExecutor(
+                    max_workers=workers, mp_context=ctx, initializer=_init_stage_state, initargs=(shared,)
+                )
+            )
+            futures = {executor.submit(fn, *args): name for name, (fn, args) in tasks.items()}
+            return {futures[future]: future.result() for future in as_completed(futures)}
+    _init_stage_state(state)
+    try:
+        return {name: fn(*args) for name, (fn, args) in tasks.items()}
+    finally:
+        _STAGE_STATE.clear()
 
 
 def run_pipeline(config: Dict[str, Any]) -> None:
     logger = logging.getLogger("wwtp_abrg")
     logger.info("Loading inputs")
 
-    ko_table = io.read_ko_table(config["input"]["ko_table"])
+    ko_table = io.read_ko_table(
+        config["input"]["ko_table"],
+        chunksize=config["parameters"].get("stream_chunksize"),
+        dtype=config["parameters"].get("dtype", "float32"),
+    )
     metadata = io.read_metadata(config["input"]["metadata"])
     annotations = io.read_annotations(config["input"]["ko_annotations"])
 
     validation.validate_samples(ko_table, metadata)
     validation.validate_non_negative(ko_table, "KO")
     validation.validate_no_missing(ko_table, "KO")
-    validation.validate_no_missing(metadata, "metadata", required_cols=["sample_id"])
-
-    io.ensure_dirs(
-        [
-            config["output"]["processed_dir"],
-            config["output"]["tables_dir"],
-            config["output"]["figures_dir"],
-            config["output"]["networks_dir"],
-        ]
-    )
-
-    logger.info("Computing relative abundance")
-    rel_abundance = analysis.compute_relative_abundance(ko_table)
-    io.write_table(rel_abundance, Path(config["output"]["processed_dir"]) / "ko_relative_abundance.csv")
-    io.write_table(ko_table, Path(config["output"]["processed_dir"]) / "ko_raw_abundance.csv")
 
-    logger.info("Computing KO richness")
-    richness = analysis.compute_richness(ko_table)
-    richness_df = richness.reset_index()
-    richness_df.columns = ["sample_id", "ko_richness"]
-    io.write_tidy(richness_df, Path(config["output"]["tables_dir"]) / "ko_richness.csv")
-
-    logger.info("Computing top KOs over time")
-    top_kos = analysis.top_kos_over_time(ko_table, config["parameters"]["top_n"])
-    io.write_table(top_kos, Path(config["output"]["tables_dir"]) / "top_kos_over_time.csv")
-
-    logger.info("Differential abundance")
     comparisons = config.get("comparisons")
     if not comparisons:
         if "period" in metadata.columns:
@@ -64,85 +266,109 @@ def run_pipeline(config: Dict[str, Any]) -> None:
         else:
             comparisons = []
             logger.warning("No comparisons configured and 'period' column missing; skipping differential abundance.")
+    runnable_comparisons = []
     for comparison in comparisons:
         group_col = comparison["group_col"]
         if group_col not in metadata.columns:
             logger.warning("Skipping comparison '%s' (missing column '%s').", comparison["name"], group_col)
             continue
-        diff = analysis.differential_abundance(
-            ko_table,
-            metadata,
-            group_col=group_col,
-            group_a=comparison["group_a"],
-            group_b=comparison["group_b"],
-            method=comparison.get("method", "ttest"),
-        )
-        io.write_table(
-            diff.table,
-            Path(config["output"]["tables_dir"]) / f"differential_abundance_{comparison['name']}.csv",
-        )
-        io.write_table(
-            diff.summary,
-            Path(config["output"]["tables_dir"]) / f"differential_abundance_{comparison['name']}_summary.csv",
-        )
-
-    logger.info("PCA and PCoA")
-    pca_coords = analysis.compute_pca(rel_abundance)
-    io.write_table(pca_coords, Path(config["output"]["tables_dir"]) / "pca_coordinates.csv")
+        runnable_comparisons.append(comparison)
 
-    pcoa_coords, pcoa_variance = analysis.compute_pcoa(rel_abundance, metric=config["parameters"]["pcoa_metric"])
-    io.write_table(pcoa_coords, Path(config["output"]["tables_dir"]) / "pcoa_coordinates.csv")
-    io.write_table(pcoa_variance.to_frame("proportion"), Path(config["output"]["tables_dir"]) / "pcoa_variance.csv")
+    # Only the metadata columns the run reads must be complete: sample IDs, days,
+    # the PERMANOVA grouping and every comparison's group column.
+    required_cols = ["sample_id"]
+    required_cols += [col for col in ("day", "period") if col in metadata.columns]
+    required_cols += [comparison["group_col"] for comparison in runnable_comparisons]
+    validation.validate_no_missing(metadata, "metadata", required_cols=list(dict.fromkeys(required_cols)))
 
-    bray_curtis = analysis.compute_bray_curtis(rel_abundance)
-    io.write_table(bray_curtis, Path(config["output"]["tables_dir"]) / "bray_curtis_distance.csv")
+    # Sample ordering by day is shared by the heatmaps, time series and richness plot.
+    days_by_sample = analysis.sorted_days(metadata) if "day" in metadata.columns else None
 
-    permanova_df = analysis.compute_permanova(bray_curtis, metadata)
-    io.write_tidy(permanova_df, Path(config["output"]["tables_dir"]) / "permanova.csv")
+    processed_dir = Path(config["output"]["processed_dir"])
+    tables_dir = Path(config["output"]["tables_dir"])
+    figures_dir = Path(config["output"]["figures_dir"])
+    networks_dir = Path(config["output"]["networks_dir"])
+    manifest_path = Path(config["output"]["manifest"])
+    io.ensure_dirs([processed_dir, tables_dir, figures_dir, networks_dir, manifest_path.parent])
 
-    clustering = analysis.compute_clustering(bray_curtis, method=config["parameters"]["clustering_method"])
-    io.write_table(clustering, Path(config["output"]["tables_dir"]) / "clustering.csv")
+    stratified_path = config["input"].get("ko_stratified")
+    stratified = io.read_stratified(stratified_path) if stratified_path else None
+    scenarios = config.get("scenarios", {})
+    if stratified is None and any(settings.get("use_stratified", False) for settings in scenarios.values()):
+        raise ValueError("use_stratified is True but no stratified KO table was provided.")
 
-    logger.info("Network analysis")
-    edges = network.spearman_network(
-        rel_abundance,
-        r_threshold=config["parameters"]["correlation_r"],
-        p_threshold=config["parameters"]["p_value"],
-    )
-    io.write_tidy(edges, Path(config["output"]["networks_dir"]) / "spearman_edges.csv")
+    cache_dir = config["output"].get("cache_dir")
+    steps = StepCache(Path(cache_dir) if cache_dir else None)
+    input_keys = {"ko_table": None, "rel_abundance": None, "stratified": None, "annotations": None}
+    if steps.root is not None:
+        input_keys["ko_table"] = fingerprint("ko_table", ko_table)
+        input_keys["rel_abundance"] = fingerprint(
+            "rel_abundance", (input_keys["ko_table"], config["parameters"].get("dtype", "float32"))
+        )
+        input_keys["annotations"] = fingerprint("annotations", annotations)
+        if stratified is not None:
+            input_keys["stratified"] = fingerprint("stratified", stratified)
 
-    logger.info("Taxon attribution")
-    stratified_path = config["input"].get("ko_stratified")
-    stratified = None
-    if stratified_path:
-        stratified = io.read_stratified(stratified_path)
-        stratified_summary = analysis.summarize_stratified(stratified)
-        io.write_tidy(
-            stratified_summary,
-            Path(config["output"]["tables_dir"]) / "taxon_contributions.csv",
+    # Every stratified scenario ranks the same collapsed table, so build it once up front.
+    stratified_ko_table = None
+    if any(settings.get("use_stratified", False) for settings in scenarios.values()):
+        stratified_ko_table = steps.run(
+            "stratified_ko_table",
+            (input_keys["stratified"],),
+            lambda: analysis.stratified_to_ko_table(stratified),
         )
 
-    logger.info("Top 30 ABRGs scenarios")
-    scenarios = config.get("scenarios", {})
-    top30_results = {}
+    logger.info("Computing relative abundance")
+    raw_cache = analysis.AbundanceCache(ko_table)
+    rel_abundance = analysis.compute_relative_abundance(
+        ko_table, dtype=config["parameters"].get("dtype", "float32"), cache=raw_cache
+    )
+    rel_cache = analysis.AbundanceCache(rel_abundance)
+    processed_format = config["output"].get("format", "auto")
+    io.write_table(rel_abundance, processed_dir / "ko_relative_abundance.csv", fmt=processed_format)
+    if processed_format != "parquet" and Path(config["input"]["ko_table"]).suffix == ".csv":
+        io.mirror_file(config["input"]["ko_table"], processed_dir / "ko_raw_abundance.csv")
+    else:
+        io.write_table(ko_table, processed_dir / "ko_raw_abundance.csv", fmt=processed_format)
+
+    tasks: Dict[str, Tuple[Callable[..., Any], Tuple[Any, ...]]] = {
+        "richness": (_stage_richness, ()),
+        "top_kos": (_stage_top_kos, ()),
+        "differential": (_stage_differential, (runnable_comparisons,)),
+        "pca": (_stage_pca, ()),
+        "pcoa": (_stage_pcoa, ()),
+        "distances": (_stage_distances, ()),
+        "network": (_stage_network, ()),
+    }
+    if stratified is not None:
+        tasks["taxon"] = (_stage_taxon, (stratified,))
     for name, settings in scenarios.items():
-        mechanism = settings.get("mechanism")
-        prevalence = settings.get("min_prevalence", config["parameters"]["prevalence_threshold"])
-        use_stratified = settings.get("use_stratified", False)
-        scenario_table = ko_table
-        if use_stratified:
-            if stratified is None:
-                raise ValueError("use_stratified is True but no stratified KO table was provided.")
-            scenario_table = analysis.stratified_to_ko_table(stratified)
-        top30 = analysis.generate_top30(
-            scenario_table,
-            annotations,
-            top_n=config["parameters"]["top30_n"],
-            prevalence_threshold=prevalence,
-            mechanism_filter=mechanism if mechanism else None,
-        )
-        top30_results[name] = top30
-        io.write_table(top30, Path(config["output"]["tables_dir"]) / f"top30_{name}.csv")
+        tasks[f"top30:{name}"] = (_stage_scenario, (name, settings))
+    state = {
+        "config": config,
+        "ko_table": ko_table,
+        "rel_abundance": rel_abundance,
+        "metadata": metadata,
+        "annotations": annotations,
+        "stratified_ko_table": stratified_ko_table,
+        "raw_cache": raw_cache,
+        "rel_cache": rel_cache,
+        "steps": steps,
+        "input_keys": input_keys,
+        "tables_dir": tables_dir,
+        "networks_dir": networks_dir,
+    }
+    cpu_budget = _worker_count(config["parameters"].get("n_jobs"))
+    workers = min(len(tasks), cpu_budget)
+    # Split the CPU budget between pool processes so threaded kernels do not oversubscribe.
+    state["kernel_jobs"] = max(1, cpu_budget // workers)
+    logger.info("Running %d analysis stages on %d worker(s)", len(tasks), workers)
+    results = _run_stages(tasks, state, workers)
+    richness_df = results["richness"]
+    top_kos = results["top_kos"]
+    pca_coords = results["pca"]
+    pcoa_coords = results["pcoa"]
+    top30_results = {name: results[f"top30:{name}"] for name in scenarios}
 
     logger.info("Generating Table 1")
     mixed_top30 = top30_results.get("mixed")
@@ -153,9 +379,10 @@ def run_pipeline(config: Dict[str, Any]) -> None:
             top_n=config["parameters"]["top30_n"],
             prevalence_threshold=config["parameters"]["prevalence_threshold"],
             mechanism_filter=None,
+            cache=raw_cache,
         )
     table1 = analysis.build_table1(mixed_top30)
-    io.write_tidy(table1, Path(config["output"]["tables_dir"]) / "Table1_Top30_major_ABRGs.csv")
+    io.write_tidy(table1, tables_dir / "Table1_Top30_major_ABRGs.csv")
     table1_md = table1.to_markdown(index=False)
     docs_path = Path("docs")
     docs_path.mkdir(parents=True, exist_ok=True)
@@ -164,43 +391,16 @@ def run_pipeline(config: Dict[str, Any]) -> None:
         md_handle.write(table1_md + "\n")
 
     logger.info("Generating figures")
-    figures.plot_top_kos(top_kos, Path(config["output"]["figures_dir"]) / "top_kos_over_time.png")
+    from wwtp_abrg import figures
+
     group_col = None
     for candidate in ["period", "season", "phase"]:
         if candidate in metadata.columns:
             group_col = candidate
             break
     annotate_samples = config["parameters"].get("plot_annotate_samples", False)
-    figures.plot_pca(
-        pca_coords,
-        metadata,
-        group_col=group_col,
-        annotate_samples=annotate_samples,
-        output_path=Path(config["output"]["figures_dir"]) / "pca.png",
-    )
-    figures.plot_pcoa(
-        pcoa_coords,
-        metadata,
-        group_col=group_col,
-        annotate_samples=annotate_samples,
-        output_path=Path(config["output"]["figures_dir"]) / "pcoa.png",
-    )
 
-    if top30_results.get("mixed") is None:
-        top30_results["mixed"] = analysis.generate_top30(
-            ko_table,
-            annotations,
-            top_n=config["parameters"]["top30_n"],
-            prevalence_threshold=config["parameters"]["prevalence_threshold"],
-            mechanism_filter=None,
-        )
-    figures.plot_top30_heatmap(
-        rel_abundance,
-        metadata,
-        top30_results["mixed"],
-        Path(config["output"]["figures_dir"]) / "heatmap_top30_mixed.png",
-        label_style=config["parameters"].get("heatmap_label_style", "KO_gene"),
-    )
+    top30_results.setdefault("mixed", mixed_top30)
     if top30_results.get("efflux_only") is None:
         top30_results["efflux_only"] = analysis.generate_top30(
             ko_table,
@@ -208,46 +408,70 @@ def run_pipeline(config: Dict[str, Any]) -> None:
             top_n=config["parameters"]["top30_n"],
             prevalence_threshold=config["parameters"]["prevalence_threshold"],
             mechanism_filter=["Efflux"],
+            cache=raw_cache,
+        )
+    label_style = config["parameters"].get("heatmap_label_style", "KO_gene")
+
+    # Plots are independent Figure objects; render them concurrently on threads.
+    plots: List[Tuple[Callable[..., None], Tuple[Any, ...], Dict[str, Any]]] = [
+        (figures.plot_top_kos, (top_kos, figures_dir / "top_kos_over_time.png"), {}),
+        (
+            figures.plot_pca,
+            (pca_coords, metadata),
+            {"group_col": group_col, "annotate_samples": annotate_samples, "output_path": figures_dir / "pca.png"},
+        ),
+        (
+            figures.plot_pcoa,
+            (pcoa_coords, metadata),
+            {"group_col": group_col, "annotate_samples": annotate_samples, "output_path": figures_dir / "pcoa.png"},
+        ),
+    ]
+    for scenario in ["mixed", "efflux_only"]:
+        plots.append(
+            (
+                figures.plot_top30_heatmap,
+                (rel_abundance, metadata, top30_results[scenario], figures_dir / f"heatmap_top30_{scenario}.png"),
+                {"label_style": label_style, "days": days_by_sample},
+            )
         )
-    figures.plot_top30_heatmap(
-        rel_abundance,
-        metadata,
-        top30_results["efflux_only"],
-        Path(config["output"]["figures_dir"]) / "heatmap_top30_efflux_only.png",
-        label_style=config["parameters"].get("heatmap_label_style", "KO_gene"),
-    )
 
     if "day" in metadata.columns:
         tidy_ts = analysis.top_kos_time_series_tidy(
             rel_abundance,
             metadata,
             top_n=config["parameters"].get("time_series_top_n", 10),
+            cache=rel_cache,
+            days=days_by_sample,
         )
-        io.write_tidy(
-            tidy_ts,
-            Path(config["output"]["tables_dir"]) / "top_kos_time_series_tidy.csv",
+        io.write_tidy(tidy_ts, tables_dir / "top_kos_time_series_tidy.csv")
+        plots.append(
+            (
+                figures.plot_top_kos_time_series,
+                (tidy_ts, figures_dir / "top_kos_time_series.png"),
+                {"rolling_window": config["parameters"].get("rolling_window_days", 7)},
+            )
         )
-        figures.plot_top_kos_time_series(
-            tidy_ts,
-            Path(config["output"]["figures_dir"]) / "top_kos_time_series.png",
-            rolling_window=config["parameters"].get("rolling_window_days", 7),
-        )
-        figures.plot_richness_over_time(
-            richness_df,
-            metadata,
-            Path(config["output"]["figures_dir"]) / "richness_over_time.png",
+        plots.append(
+            (
+                figures.plot_richness_over_time,
+                (richness_df, metadata, figures_dir / "richness_over_time.png"),
+                {"days": days_by_sample},
+            )
         )
 
+    with ThreadPoolExecutor(max_workers=min(len(plots), cpu_budget)) as executor:
+        for future in [executor.submit(fn, *args, **kwargs) for fn, args, kwargs in plots]:
+            future.result()
+
     logger.info("Writing manifest")
     manifest = {
-        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "timestamp": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
         "version": __version__,
         "parameters": config["parameters"],
         "inputs": config["input"],
+        "input_hashes": {key: hash_file(path) for key, path in config["input"].items() if path},
         "outputs": config["output"],
     }
-    Path(config["output"]["manifest"]).parent.mkdir(parents=True, exist_ok=True)
-    with Path(config["output"]["manifest"]).open("w", encoding="utf-8") as handle:
-        json.dump(manifest, handle, indent=2)
+    io.write_json(manifest, manifest_path)
 
     logger.info("Pipeline complete")
@@ -6,7 +6,6 @@ import argparse
 import logging
 
 from wwtp_abrg.config import load_config
-from wwtp_abrg.pipeline import run_pipeline
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -19,6 +18,9 @@ def main() -> None:
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
     parser = build_parser()
     args = parser.parse_args()
+    # Deferred so ``--help`` does not pay for pandas, scipy and scikit-bio.
+    from wwtp_abrg.pipeline import run_pipeline
+
     config = load_config(args.config)
     run_pipeline(config)
 
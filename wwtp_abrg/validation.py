@@ -4,15 +4,18 @@ from __future__ import annotations
 
 from typing import Iterable
 
+import numpy as np
 import pandas as pd
 
 
 def validate_samples(ko_table: pd.DataFrame, metadata: pd.DataFrame) -> None:
     """Ensure sample IDs match between KO table and metadata."""
-    sample_cols = list(ko_table.columns)
-    metadata_samples = metadata["sample_id"].tolist()
-    missing_in_metadata = sorted(set(sample_cols) - set(metadata_samples))
-    missing_in_table = sorted(set(metadata_samples) - set(sample_cols))
+    sample_cols = ko_table.columns
+    if sample_cols.has_duplicates:
+        raise ValueError(f"Duplicate sample IDs in KO table: {sample_cols[sample_cols.duplicated()].unique().tolist()}")
+    metadata_samples = pd.Index(metadata["sample_id"])
+    missing_in_metadata = sample_cols.difference(metadata_samples).tolist()
+    missing_in_table = metadata_samples.difference(sample_cols).tolist()
     if missing_in_metadata or missing_in_table:
         raise ValueError(
             "Sample ID mismatch."
@@ -22,14 +25,28 @@ def validate_samples(ko_table: pd.DataFrame, metadata: pd.DataFrame) -> None:
 
 
 def validate_non_negative(df: pd.DataFrame, name: str) -> None:
-    if (df < 0).any().any():
+    values = df.to_numpy()
+    if values.dtype.kind == "u":
+        return
+    negative = (values < 0).any() if values.dtype.kind in "fi" else (df < 0).any().any()
+    if negative:
         raise ValueError(f"Negative values found in {name} table.")
 
 
 def validate_no_missing(df: pd.DataFrame, name: str, required_cols: Iterable[str] | None = None) -> None:
-    if df.isna().any().any():
-        raise ValueError(f"Missing values found in {name} table.")
-    if required_cols:
+    """Reject missing values, only within ``required_cols`` when they are given."""
+    if required_cols is not None:
+        required_cols = list(required_cols)
         missing_cols = [col for col in required_cols if col not in df.columns]
         if missing_cols:
             raise ValueError(f"Missing required columns in {name}: {missing_cols}.")
+        df = df[required_cols]
+    values = df.to_numpy()
+    if values.dtype.kind in "iub":
+        missing = False
+    elif values.dtype.kind == "f":
+        missing = np.isnan(values).any()
+    else:
+        missing = pd.isna(values).any()
+    if missing:
+        raise ValueError(f"Missing values found in {name} table.")